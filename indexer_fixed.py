@@ -2,7 +2,12 @@
 import os
 import sys
 import math
-from collections import defaultdict
+import codecs
+import multiprocessing
+import tempfile
+from array import array
+from collections import Counter, defaultdict
+from operator import mul
 
 # Add the utility imports
 sys.path.append('.')
@@ -10,17 +15,155 @@ from utils import *
 from stop_words import is_stop_word
 from porterstemmer import PorterStemmer
 
+# Each worker process gets its own stemmer and stem cache when the module
+# is imported
+_stemmer = PorterStemmer()
+_stem_cache = {}
+
+# Number of postings read back from the spill file at a time
+SPILL_CHUNK = 1 << 16
+
+# Corpus directory files are indexed if they have one of these extensions,
+# or no extension and text-like content; larger files are skipped
+TEXT_EXTENSIONS = ('.txt', '.cacm', '.all', '.html', '.xml')
+MAX_FILE_SIZE = 100 * 1024 * 1024  # bytes
+SNIFF_BYTES = 512
+
+def iter_stems(tokens):
+    """Yield the stemmed form of every token that passes the filters.
+    
+    Tokens must already be normalized (see extract_terms).
+    """
+    for token_lower in tokens:
+        # Apply filters
+        if is_stop_word(token_lower):
+            continue
+        if starts_with_punctuation(token_lower):
+            continue
+        if is_short(token_lower):
+            continue
+        if is_number(token_lower):
+            continue
+        
+        # Stem the token, reusing earlier results for repeated word forms
+        stemmed = _stem_cache.get(token_lower)
+        if stemmed is None:
+            stemmed = _stemmer.stem(token_lower, 0, len(token_lower) - 1)
+            _stem_cache[token_lower] = stemmed
+        
+        yield stemmed
+
+def extract_terms(content):
+    """Tokenize, filter and stem content into a term -> frequency map."""
+    # Lowercasing the whole content once replaces normalize_token on every
+    # token: the tokenizer only yields alphanumerics, so there is nothing
+    # to strip. Counter then tallies the generator in C.
+    return Counter(iter_stems(splitchars(content.lower())))
+
+def split_documents(content, doc_file):
+    """Split file content into (doc_path, doc_content) pairs."""
+    # If it's a large file, it might contain multiple documents
+    # For CACM, documents might be separated by markers
+    if len(content) > 100000:  # Large file
+        print(f"  Large file detected ({len(content)} chars), checking for document markers...")
+        
+        # Try different CACM document separators
+        separators = ['.I ', '.T\n', '.W\n', '.B\n', '.A\n', '.N\n', '.X\n']
+        
+        for sep in separators:
+            if sep in content:
+                print(f"  Found separator '{sep}', splitting documents...")
+                docs = content.split(sep)
+                return [(f"{doc_file}#doc{doc_num}", doc_content)
+                        for doc_num, doc_content in enumerate(docs[1:], 1)  # Skip first
+                        if doc_content.strip()]
+    
+    # Small file or no separators found, treat as single document
+    return [(doc_file, content)]
+
+def looks_like_text(path):
+    """Check whether a file starts with mostly printable text."""
+    try:
+        with open(path, 'rb') as f:
+            sample = f.read(SNIFF_BYTES)
+    except OSError:
+        return False
+    
+    if b'\0' in sample:
+        return False
+    
+    # The sample must be valid UTF-8; a multibyte character cut off at the
+    # end of the sample is held back by the incremental decoder
+    try:
+        text = codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return False
+    
+    if not text:
+        return False
+    
+    printable = sum(1 for ch in text if ch.isprintable() or ch in '\t\n\r\f')
+    return printable / len(text) >= 0.9
+
+def is_corpus_file(path):
+    """Decide whether a file found under the corpus directory should be indexed."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext and ext not in TEXT_EXTENSIONS:
+        return False
+    
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return False
+    
+    if size > MAX_FILE_SIZE:
+        print(f"Skipping {path}: larger than {MAX_FILE_SIZE} bytes")
+        return False
+    
+    return bool(ext) or looks_like_text(path)
+
+def read_file(doc_file):
+    """Read a corpus file, hinting sequential access to the OS."""
+    with open(doc_file, 'r', encoding='utf-8', errors='ignore') as f:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        return f.read()
+
+def _process_file(doc_file):
+    """Read and tokenize one corpus file; runs in a worker process.
+    
+    Returns (doc_file, documents, error) where documents is a list of
+    (doc_path, term_freq) pairs.
+    """
+    try:
+        content = read_file(doc_file)
+        documents = [(doc_path, extract_terms(doc_content))
+                     for doc_path, doc_content in split_documents(content, doc_file)]
+        return doc_file, documents, None
+    
+    except Exception as e:
+        return doc_file, [], str(e)
+
 class IndexerFixed:
     def __init__(self, corpus_path):
         self.corpus_path = corpus_path
-        self.stemmer = PorterStemmer()
         
         # Data structures
         self.documents = {}
         self.terms = {}
-        self.postings = defaultdict(dict)
         self.doc_lengths = {}
         
+        # Postings are spilled to a temporary file as (term_id, doc_id, tf)
+        # int triples in document order, so memory use does not grow with
+        # the number of postings
+        self.spill = tempfile.TemporaryFile()
+        self.total_postings = 0
+        
+        # Per-term statistics; df is counted as documents are added and idf
+        # is filled in by calculate_tf_idf as a list indexed by term_id
+        self.term_df = Counter()
+        self.term_idf = []
+        
         # Counters
         self.next_doc_id = 1
         self.next_term_id = 1
@@ -42,9 +185,9 @@ class IndexerFixed:
             doc_files = []
             for root, dirs, files in os.walk(self.corpus_path):
                 for file in files:
-                    # Accept more file types
-                    if any(file.endswith(ext) for ext in ['.txt', '.cacm', '.all', '.html', '.xml', '']):
-                        doc_files.append(os.path.join(root, file))
+                    path = os.path.join(root, file)
+                    if is_corpus_file(path):
+                        doc_files.append(path)
         else:
             print(f"Path not found: {self.corpus_path}")
             return False
@@ -55,46 +198,22 @@ class IndexerFixed:
             print("No files found! Check your corpus path.")
             return False
         
-        # Process each file
+        # Read, tokenize and stem files in parallel worker processes, so one
+        # worker's reads overlap the others' tokenizing; imap keeps the input
+        # order so document ids stay deterministic across runs
         processed_count = 0
-        for i, doc_file in enumerate(doc_files, 1):
-            print(f"Processing file {i}/{len(doc_files)}: {os.path.basename(doc_file)}")
-            
-            try:
-                with open(doc_file, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
+        with multiprocessing.Pool() as pool:
+            results = pool.imap(_process_file, doc_files, chunksize=8)
+            for i, (doc_file, documents, error) in enumerate(results, 1):
+                print(f"Processing file {i}/{len(doc_files)}: {os.path.basename(doc_file)}")
                 
-                # If it's a large file, it might contain multiple documents
-                # For CACM, documents might be separated by markers
-                if len(content) > 100000:  # Large file
-                    print(f"  Large file detected ({len(content)} chars), checking for document markers...")
-                    
-                    # Try different CACM document separators
-                    separators = ['.I ', '.T\n', '.W\n', '.B\n', '.A\n', '.N\n', '.X\n']
-                    
-                    for sep in separators:
-                        if sep in content:
-                            print(f"  Found separator '{sep}', splitting documents...")
-                            docs = content.split(sep)
-                            for doc_num, doc_content in enumerate(docs[1:], 1):  # Skip first
-                                if doc_content.strip():
-                                    doc_id = self.process_document_content(doc_content, f"{doc_file}#doc{doc_num}")
-                                    if doc_id:
-                                        processed_count += 1
-                            break
-                    else:
-                        # No separators found, treat as single document
-                        doc_id = self.process_document_content(content, doc_file)
-                        if doc_id:
-                            processed_count += 1
-                else:
-                    # Small file, treat as single document
-                    doc_id = self.process_document_content(content, doc_file)
-                    if doc_id:
-                        processed_count += 1
-                        
-            except Exception as e:
-                print(f"  Error processing {doc_file}: {e}")
+                if error is not None:
+                    print(f"  Error processing {doc_file}: {error}")
+                    continue
+                
+                for doc_path, term_freq in documents:
+                    self.add_document(doc_path, term_freq)
+                    processed_count += 1
         
         if processed_count == 0:
             print("No documents were processed!")
@@ -118,82 +237,83 @@ class IndexerFixed:
         
         return True
     
-    def process_document_content(self, content, doc_path):
-        """Process document content and extract terms."""
-        try:
-            doc_id = self.next_doc_id
-            self.documents[doc_path] = doc_id
-            self.next_doc_id += 1
-            
-            # Tokenize content
-            tokens = splitchars(content)
-            term_freq = defaultdict(int)
-            
-            for token in tokens:
-                # Normalize and filter token
-                token_lower = normalize_token(token)
-                
-                # Apply filters
-                if is_stop_word(token_lower):
-                    continue
-                if starts_with_punctuation(token_lower):
-                    continue
-                if is_short(token_lower):
-                    continue
-                if is_number(token_lower):
-                    continue
-                
-                # Stem the token
-                stemmed = self.stemmer.stem(token_lower, 0, len(token_lower) - 1)
-                
-                # Update term frequency
-                term_freq[stemmed] += 1
+    def add_document(self, doc_path, term_freq):
+        """Assign a document id and spill the document's postings."""
+        doc_id = self.next_doc_id
+        self.documents[doc_path] = doc_id
+        self.next_doc_id += 1
+        
+        # Update postings
+        postings = array('i')
+        for term, freq in term_freq.items():
+            if term not in self.terms:
+                self.terms[term] = self.next_term_id
+                self.next_term_id += 1
             
-            # Update postings
-            for term, freq in term_freq.items():
-                if term not in self.terms:
-                    self.terms[term] = self.next_term_id
-                    self.next_term_id += 1
-                
-                term_id = self.terms[term]
-                self.postings[term_id][doc_id] = {'tf': freq}
+            term_id = self.terms[term]
+            self.term_df[term_id] += 1
+            postings.extend((term_id, doc_id, freq))
+        
+        postings.tofile(self.spill)
+        self.total_postings += len(term_freq)
+        
+        return doc_id
+    
+    def iter_spill(self):
+        """Yield (term_ids, doc_ids, tfs) arrays for successive chunks of the spill file."""
+        offset = 0
+        while True:
+            chunk = array('i')
+            self.spill.seek(offset)
+            try:
+                chunk.fromfile(self.spill, 3 * SPILL_CHUNK)
+            except EOFError:
+                pass  # the last chunk is short; fromfile keeps what it read
             
-            return doc_id
+            if not chunk:
+                return
             
-        except Exception as e:
-            print(f"Error processing document {doc_path}: {e}")
-            return None
+            offset += len(chunk) * chunk.itemsize
+            yield chunk[0::3], chunk[1::3], chunk[2::3]
+    
+    def iter_postings(self):
+        """Like iter_spill, with a fourth array of tf_idf weights per chunk.
+        
+        Weights are stored as float32, which is ample precision for cosine
+        ranking and halves their size on disk.
+        """
+        for term_ids, doc_ids, tfs in self.iter_spill():
+            idfs = map(self.term_idf.__getitem__, term_ids)
+            yield term_ids, doc_ids, tfs, array('f', map(mul, tfs, idfs))
     
     def calculate_tf_idf(self):
-        """Calculate TF-IDF weights."""
+        """Calculate TF-IDF weights and accumulate squared document lengths."""
         N = len(self.documents)
         
-        for term_id, doc_postings in self.postings.items():
-            df = len(doc_postings)
-            
-            if df == 0:
-                continue
-                
-            idf = math.log(N / df)
-            
-            for doc_id, posting in doc_postings.items():
-                tf = posting['tf']
-                tf_idf = tf * idf
-                posting['tf_idf'] = tf_idf
-                posting['idf'] = idf
-                posting['df'] = df
+        # IDF is computed once per term from the document frequencies. A
+        # dense list makes the per-posting lookup in iter_postings a plain
+        # index rather than a hash probe.
+        log = math.log
+        self.term_idf = [0.0] * self.next_term_id
+        for term_id, df in self.term_df.items():
+            self.term_idf[term_id] = log(N / df)
+        
+        # Weights are recomputed from the spill when the index is saved, so
+        # this pass only needs their squares per document. The lengths are
+        # taken from the float32 weights so they match what gets saved.
+        squared_lengths = defaultdict(float)
+        for _, doc_ids, _, weights in self.iter_postings():
+            for doc_id, tf_idf in zip(doc_ids, weights):
+                squared_lengths[doc_id] += tf_idf * tf_idf
+        
+        self.doc_lengths = squared_lengths
     
     def calculate_document_lengths(self):
         """Calculate document vector lengths."""
-        for doc_path, doc_id in self.documents.items():
-            doc_vector_length = 0
-            
-            for term_id, doc_postings in self.postings.items():
-                if doc_id in doc_postings:
-                    tf_idf = doc_postings[doc_id]['tf_idf']
-                    doc_vector_length += tf_idf * tf_idf
-            
-            self.doc_lengths[doc_id] = math.sqrt(doc_vector_length)
+        # calculate_tf_idf already summed the squared weights in its single
+        # pass over the postings, so only the square roots are left to take
+        self.doc_lengths = {doc_id: math.sqrt(self.doc_lengths.get(doc_id, 0.0))
+                            for doc_id in self.documents.values()}
     
     def save_index(self, output_dir='.'):
         """Save index to files."""
@@ -206,25 +326,27 @@ class IndexerFixed:
                 for doc_path, doc_id in self.documents.items():
                     f.write(f"{doc_path},{doc_id}\n")
             
-            # Save terms
+            # Save terms with their document frequency and IDF, which are
+            # stored once per term rather than repeated on every posting
             with open(os.path.join(output_dir, 'terms.dat'), 'w') as f:
                 for term, term_id in self.terms.items():
-                    f.write(f"{term},{term_id}\n")
+                    df = self.term_df[term_id]
+                    idf = self.term_idf[term_id]
+                    f.write(f"{term},{term_id},{df},{idf}\n")
             
-            # Save postings
-            with open(os.path.join(output_dir, 'postings.dat'), 'w') as f:
-                for term_id, doc_postings in self.postings.items():
-                    for doc_id, posting in doc_postings.items():
-                        tf_idf = posting.get('tf_idf', 0)
-                        tf = posting.get('tf', 0)
-                        idf = posting.get('idf', 0)
-                        df = posting.get('df', 0)
-                        f.write(f"{term_id},{doc_id},{tf_idf:.6f},{tf},{idf:.6f},{df}\n")
+            # Save postings and document lengths as raw binary columns, which
+            # reload without text parsing or loss of precision. Postings are
+            # streamed from the spill file one column at a time.
+            count = self.total_postings
+            write_arrays(os.path.join(output_dir, 'postings.bin'),
+                         [('i', count, (term_ids for term_ids, _, _ in self.iter_spill())),
+                          ('i', count, (doc_ids for _, doc_ids, _ in self.iter_spill())),
+                          ('i', count, (tfs for _, _, tfs in self.iter_spill())),
+                          ('f', count, (weights for *_, weights in self.iter_postings()))])
             
-            # Save document lengths
-            with open(os.path.join(output_dir, 'doc_lengths.dat'), 'w') as f:
-                for doc_id, length in self.doc_lengths.items():
-                    f.write(f"{doc_id},{length:.6f}\n")
+            write_arrays(os.path.join(output_dir, 'doc_lengths.bin'),
+                         [array('i', self.doc_lengths.keys()),
+                          array('d', self.doc_lengths.values())])
             
             print(f"Index saved to {output_dir}/")
             return True
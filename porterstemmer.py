@@ -4,6 +4,41 @@ Porter Stemmer - Complete implementation
 No changes needed from original Indexer Part 2
 """
 
+# Suffix tables for steps 2-4, keyed on the letter the stem step dispatches
+# on and tried in order; the first suffix that matches wins
+STEP2_SUFFIXES = {
+    'a': (("ational", "ate"), ("tional", "tion")),
+    'c': (("enci", "ence"), ("anci", "ance")),
+    'e': (("izer", "ize"),),
+    'l': (("bli", "ble"), ("alli", "al"), ("entli", "ent"), ("eli", "e"), ("ousli", "ous")),
+    'o': (("ization", "ize"), ("ation", "ate"), ("ator", "ate")),
+    's': (("alism", "al"), ("iveness", "ive"), ("fulness", "ful"), ("ousness", "ous")),
+    't': (("aliti", "al"), ("iviti", "ive"), ("biliti", "ble")),
+    'g': (("logi", "log"),),
+}
+
+STEP3_SUFFIXES = {
+    'e': (("icate", "ic"), ("ative", ""), ("alize", "al")),
+    'i': (("iciti", "ic"),),
+    'l': (("ical", "ic"), ("ful", "")),
+    's': (("ness", ""),),
+}
+
+STEP4_SUFFIXES = {
+    'a': ("al",),
+    'c': ("ance", "ence"),
+    'e': ("er",),
+    'i': ("ic",),
+    'l': ("able", "ible"),
+    'n': ("ant", "ement", "ment", "ent"),
+    'o': ("ion", "ou"),
+    's': ("ism",),
+    't': ("ate", "iti"),
+    'u': ("ous",),
+    'v': ("ive",),
+    'z': ("ize",),
+}
+
 class PorterStemmer:
     def __init__(self):
         self.b = ""  # buffer for word to be stemmed
@@ -13,44 +48,36 @@ class PorterStemmer:
 
     def cons(self, i):
         """cons(i) is TRUE <=> b[i] is a consonant."""
-        if self.b[i] in ('a', 'e', 'i', 'o', 'u'):
+        ch = self.b[i]
+        if ch in 'aeiou':
             return False
-        if self.b[i] == 'y':
+        if ch == 'y':
             return i == self.k0 or not self.cons(i - 1)
         return True
 
     def m(self):
-        """m() measures the number of consonant sequences between k0 and j."""
+        """m() measures the number of consonant sequences between k0 and j.
+        
+        Every word has the form [C](VC)^m[V], so m is the number of
+        vowel-to-consonant transitions in k0,...j.
+        """
         n = 0
-        i = self.k0
-        while True:
-            if i > self.j:
-                return n
-            if not self.cons(i):
-                break
-            i += 1
-        i += 1
-        while True:
-            while True:
-                if i > self.j:
-                    return n
-                if self.cons(i):
-                    break
-                i += 1
-            i += 1
-            n += 1
-            while True:
-                if i > self.j:
-                    return n
-                if not self.cons(i):
-                    break
-                i += 1
-            i += 1
+        cons = self.cons
+        prev_vowel = False
+        for i in range(self.k0, self.j + 1):
+            if cons(i):
+                if prev_vowel:
+                    n += 1
+                prev_vowel = False
+            else:
+                prev_vowel = True
+        return n
 
     def vowelinstem(self):
         """vowelinstem() is TRUE <=> k0,...j contains a vowel."""
+        cons = self.cons
         for i in range(self.k0, self.j + 1):
-            if not self.cons(i):
+            if not cons(i):
                 return True
         return False
 
@@ -78,14 +105,9 @@ class PorterStemmer:
 
     def ends(self, s):
         """ends(s) is TRUE <=> k0,...k ends with the string s."""
-        length = len(s)
-        if s[length - 1] != self.b[self.k]:
-            return False
-        if length > (self.k - self.k0 + 1):
-            return False
-        if self.b[self.k - length + 1:self.k + 1] != s:
+        if not self.b.endswith(s, self.k0, self.k + 1):
             return False
-        self.j = self.k - length
+        self.j = self.k - len(s)
         return True
 
     def setto(self, s):
@@ -108,10 +130,13 @@ class PorterStemmer:
                 self.setto("i")
             elif self.b[self.k - 1] != 's':
                 self.k = self.k - 1
-        if self.ends("eed"):
+        # Checking the final letter first skips the suffix tests for most words
+        last = self.b[self.k]
+        if last == 'd' and self.ends("eed"):
             if self.m() > 0:
                 self.k = self.k - 1
-        elif (self.ends("ed") or self.ends("ing")) and self.vowelinstem():
+        elif ((last == 'd' and self.ends("ed")) or (last == 'g' and self.ends("ing"))) \
+                and self.vowelinstem():
             self.k = self.j
             if self.ends("at"):
                 self.setto("ate")
@@ -129,153 +154,28 @@ class PorterStemmer:
 
     def step1c(self):
         """step1c() turns terminal y to i when there is another vowel in the stem."""
-        if self.ends("y") and self.vowelinstem():
+        if self.b[self.k] == 'y' and self.ends("y") and self.vowelinstem():
             self.b = self.b[:self.k] + 'i' + self.b[self.k + 1:]
 
     def step2(self):
         """step2() maps double suffices to single ones."""
-        if self.b[self.k - 1] == 'a':
-            if self.ends("ational"):
-                self.r("ate")
-            elif self.ends("tional"):
-                self.r("tion")
-        elif self.b[self.k - 1] == 'c':
-            if self.ends("enci"):
-                self.r("ence")
-            elif self.ends("anci"):
-                self.r("ance")
-        elif self.b[self.k - 1] == 'e':
-            if self.ends("izer"):
-                self.r("ize")
-        elif self.b[self.k - 1] == 'l':
-            if self.ends("bli"):
-                self.r("ble")
-            elif self.ends("alli"):
-                self.r("al")
-            elif self.ends("entli"):
-                self.r("ent")
-            elif self.ends("eli"):
-                self.r("e")
-            elif self.ends("ousli"):
-                self.r("ous")
-        elif self.b[self.k - 1] == 'o':
-            if self.ends("ization"):
-                self.r("ize")
-            elif self.ends("ation"):
-                self.r("ate")
-            elif self.ends("ator"):
-                self.r("ate")
-        elif self.b[self.k - 1] == 's':
-            if self.ends("alism"):
-                self.r("al")
-            elif self.ends("iveness"):
-                self.r("ive")
-            elif self.ends("fulness"):
-                self.r("ful")
-            elif self.ends("ousness"):
-                self.r("ous")
-        elif self.b[self.k - 1] == 't':
-            if self.ends("aliti"):
-                self.r("al")
-            elif self.ends("iviti"):
-                self.r("ive")
-            elif self.ends("biliti"):
-                self.r("ble")
-        elif self.b[self.k - 1] == 'g':
-            if self.ends("logi"):
-                self.r("log")
+        for suffix, replacement in STEP2_SUFFIXES.get(self.b[self.k - 1], ()):
+            if self.ends(suffix):
+                self.r(replacement)
+                break
 
     def step3(self):
         """step3() deals with -ic-, -full, -ness etc."""
-        if self.b[self.k] == 'e':
-            if self.ends("icate"):
-                self.r("ic")
-            elif self.ends("ative"):
-                self.r("")
-            elif self.ends("alize"):
-                self.r("al")
-        elif self.b[self.k] == 'i':
-            if self.ends("iciti"):
-                self.r("ic")
-        elif self.b[self.k] == 'l':
-            if self.ends("ical"):
-                self.r("ic")
-            elif self.ends("ful"):
-                self.r("")
-        elif self.b[self.k] == 's':
-            if self.ends("ness"):
-                self.r("")
+        for suffix, replacement in STEP3_SUFFIXES.get(self.b[self.k], ()):
+            if self.ends(suffix):
+                self.r(replacement)
+                break
 
     def step4(self):
         """step4() takes off -ant, -ence etc., in context <c>vcvc<v>."""
-        if self.b[self.k - 1] == 'a':
-            if self.ends("al"):
-                pass
-            else:
-                return
-        elif self.b[self.k - 1] == 'c':
-            if self.ends("ance") or self.ends("ence"):
-                pass
-            else:
-                return
-        elif self.b[self.k - 1] == 'e':
-            if self.ends("er"):
-                pass
-            else:
-                return
-        elif self.b[self.k - 1] == 'i':
-            if self.ends("ic"):
-                pass
-            else:
-                return
-        elif self.b[self.k - 1] == 'l':
-            if self.ends("able") or self.ends("ible"):
-                pass
-            else:
-                return
-        elif self.b[self.k - 1] == 'n':
-            if self.ends("ant"):
-                pass
-            elif self.ends("ement"):
-                pass
-            elif self.ends("ment"):
-                pass
-            elif self.ends("ent"):
-                pass
-            else:
-                return
-        elif self.b[self.k - 1] == 'o':
-            if self.ends("ion") and self.b[self.j] in ('s', 't'):
-                pass
-            elif self.ends("ou"):
-                pass
-            else:
-                return
-        elif self.b[self.k - 1] == 's':
-            if self.ends("ism"):
-                pass
-            else:
-                return
-        elif self.b[self.k - 1] == 't':
-            if self.ends("ate") or self.ends("iti"):
-                pass
-            else:
-                return
-        elif self.b[self.k - 1] == 'u':
-            if self.ends("ous"):
-                pass
-            else:
-                return
-        elif self.b[self.k - 1] == 'v':
-            if self.ends("ive"):
-                pass
-            else:
-                return
-        elif self.b[self.k - 1] == 'z':
-            if self.ends("ize"):
-                pass
-            else:
-                return
+        for suffix in STEP4_SUFFIXES.get(self.b[self.k - 1], ()):
+            if self.ends(suffix) and (suffix != "ion" or self.b[self.j] in ('s', 't')):
+                break
         else:
             return
         if self.m() > 1:
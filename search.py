@@ -1,7 +1,9 @@
 import os
 import sys
 import math
+import heapq
 from collections import defaultdict
+from operator import itemgetter
 from utils import *
 from stop_words import is_stop_word
 from porterstemmer import PorterStemmer
@@ -10,14 +12,17 @@ class SearchEngine:
     def __init__(self, index_dir='.'):
         self.index_dir = index_dir
         self.stemmer = PorterStemmer()
+        self._stem_cache = {}  # token -> stemmed form
         
         # Loaded data
         self.documents = {}  # doc_path -> doc_id
         self.documents_inv = {}  # doc_id -> doc_path
         self.terms = {}  # term -> term_id
         self.terms_inv = {}  # term_id -> term
-        self.postings = defaultdict(dict)  # term_id -> {doc_id: posting_data}
+        self.postings = defaultdict(dict)  # term_id -> {doc_id: tf_idf}
         self.doc_lengths = {}  # doc_id -> document length
+        self.term_doc_sets = {}  # term_id -> frozenset of doc_ids
+        self.term_idf = {}  # term_id -> idf
         
         # Statistics
         self.total_docs = 0
@@ -44,33 +49,34 @@ class SearchEngine:
             # Load terms
             self.terms = {}
             self.terms_inv = {}
+            self.term_idf = {}
             with open(os.path.join(self.index_dir, 'terms.dat'), 'r') as f:
                 for line in f:
-                    term, term_id = line.strip().split(',')
-                    term_id = int(term_id)
+                    fields = line.strip().split(',')
+                    term, term_id = fields[0], int(fields[1])
                     self.terms[term] = term_id
                     self.terms_inv[term_id] = term
+                    
+                    # Newer indexes also store df and idf per term
+                    if len(fields) == 4:
+                        self.term_idf[term_id] = float(fields[3])
             
-            # Load postings
-            self.postings = defaultdict(dict)
-            with open(os.path.join(self.index_dir, 'postings.dat'), 'r') as f:
-                for line in f:
-                    term_id, doc_id, tf_idf, tf, idf, df = line.strip().split(',')
-                    term_id = int(term_id)
-                    doc_id = int(doc_id)
-                    self.postings[term_id][doc_id] = {
-                        'tf_idf': float(tf_idf),
-                        'tf': int(tf),
-                        'idf': float(idf),
-                        'df': int(df)
-                    }
+            # Load postings and document lengths, preferring the binary files
+            # and falling back to the text files written by older indexers
+            if os.path.exists(os.path.join(self.index_dir, 'postings.bin')):
+                self.load_binary_postings()
+            else:
+                self.load_text_postings()
             
-            # Load document lengths
-            self.doc_lengths = {}
-            with open(os.path.join(self.index_dir, 'doc_lengths.dat'), 'r') as f:
-                for line in f:
-                    doc_id, length = line.strip().split(',')
-                    self.doc_lengths[int(doc_id)] = float(length)
+            # Older indexes without per-term stats get IDF from the postings
+            if not self.term_idf:
+                N = len(self.documents)
+                self.term_idf = {term_id: math.log(N / len(doc_postings))
+                                 for term_id, doc_postings in self.postings.items()}
+            
+            # Document sets per term, built once for query-time intersections
+            self.term_doc_sets = {term_id: frozenset(doc_postings)
+                                  for term_id, doc_postings in self.postings.items()}
             
             # Update statistics
             self.total_docs = len(self.documents)
@@ -86,15 +92,41 @@ class SearchEngine:
             print(f"Error loading index: {e}")
             return False
     
+    def load_binary_postings(self):
+        """Load postings and document lengths from the binary index files."""
+        term_ids, doc_ids, _, weights = read_arrays(
+            os.path.join(self.index_dir, 'postings.bin'))
+        self.postings = defaultdict(dict)
+        for term_id, doc_id, tf_idf in zip(term_ids, doc_ids, weights):
+            self.postings[term_id][doc_id] = tf_idf
+        
+        doc_ids, lengths = read_arrays(os.path.join(self.index_dir, 'doc_lengths.bin'))
+        self.doc_lengths = dict(zip(doc_ids, lengths))
+    
+    def load_text_postings(self):
+        """Load postings and document lengths from the text index files."""
+        # Only the tf_idf column is needed for ranking, so the tf, idf and
+        # df columns are left unparsed
+        self.postings = defaultdict(dict)
+        with open(os.path.join(self.index_dir, 'postings.dat'), 'r') as f:
+            for line in f:
+                term_id, doc_id, tf_idf, _ = line.split(',', 3)
+                self.postings[int(term_id)][int(doc_id)] = float(tf_idf)
+        
+        self.doc_lengths = {}
+        with open(os.path.join(self.index_dir, 'doc_lengths.dat'), 'r') as f:
+            for line in f:
+                doc_id, length = line.strip().split(',')
+                self.doc_lengths[int(doc_id)] = float(length)
+    
     def parse_query(self, query):
         """Parse and process the query terms."""
         parsed_terms = []
-        tokens = splitchars(query)
+        # Lowercase before tokenizing, exactly as the indexer does, so a query
+        # splits into the same tokens as the documents it should match
+        tokens = splitchars(query.lower())
         
-        for token in tokens:
-            # Normalize and filter
-            token_lower = normalize_token(token)
-            
+        for token_lower in tokens:
             # Apply filters
             if is_stop_word(token_lower):
                 continue
@@ -105,14 +137,17 @@ class SearchEngine:
             if is_number(token_lower):
                 continue
             
-            # Stem the token
-            stemmed = self.stemmer.stem(token_lower, 0, len(token_lower) - 1)
+            # Stem the token, reusing earlier results for repeated word forms
+            stemmed = self._stem_cache.get(token_lower)
+            if stemmed is None:
+                stemmed = self.stemmer.stem(token_lower, 0, len(token_lower) - 1)
+                self._stem_cache[token_lower] = stemmed
             
             # Check if term exists in index
             if stemmed in self.terms:
                 term_id = self.terms[stemmed]
                 parsed_terms.append({
-                    'original': token,
+                    'original': token_lower,
                     'processed': stemmed,
                     'term_id': term_id
                 })
@@ -130,13 +165,10 @@ class SearchEngine:
         
         # Build sparse query vector with TF-IDF weights
         query_vector = {}
-        N = self.total_docs
         
         for term_id, tf in term_freq.items():
-            if term_id in self.postings:
-                df = len(self.postings[term_id])
-                idf = math.log(N / df) if df > 0 else 0
-                query_vector[term_id] = tf * idf
+            if term_id in self.term_idf:
+                query_vector[term_id] = tf * self.term_idf[term_id]
         
         return query_vector
     
@@ -145,19 +177,18 @@ class SearchEngine:
         if not parsed_terms:
             return set()
         
-        # Start with documents containing the first term
-        first_term_id = parsed_terms[0]['term_id']
-        candidate_docs = set(self.postings[first_term_id].keys())
+        # If a term doesn't exist in any document, return empty set
+        term_ids = {term_info['term_id'] for term_info in parsed_terms}
+        if any(term_id not in self.term_doc_sets for term_id in term_ids):
+            return set()
         
-        # Intersect with documents containing other terms
-        for term_info in parsed_terms[1:]:
-            term_id = term_info['term_id']
-            if term_id in self.postings:
-                term_docs = set(self.postings[term_id].keys())
-                candidate_docs = candidate_docs.intersection(term_docs)
-            else:
-                # If a term doesn't exist in any document, return empty set
-                return set()
+        # Intersect starting from the rarest term so the candidates shrink fastest
+        doc_sets = sorted((self.term_doc_sets[term_id] for term_id in term_ids), key=len)
+        candidate_docs = doc_sets[0]
+        for term_docs in doc_sets[1:]:
+            if not candidate_docs:
+                break
+            candidate_docs = candidate_docs & term_docs
         
         return candidate_docs
     
@@ -191,21 +222,19 @@ class SearchEngine:
             print("Query vector has zero length!")
             return []
         
-        # Calculate cosine similarity for each candidate document
+        # Calculate cosine similarity for each candidate document. The dot
+        # products are the rows of the sparse product D @ q for the
+        # candidates only: every candidate contains every query term, so each
+        # row takes one lookup per query term, and postings of documents
+        # outside the all-terms intersection are never read.
+        query_postings = [(self.postings[term_id], q_weight)
+                          for term_id, q_weight in query_vector.items()]
         results = []
         
         for doc_id in candidate_docs:
-            # Get document vector (sparse)
-            doc_vector = {}
-            for term_id, weight in query_vector.items():
-                if doc_id in self.postings[term_id]:
-                    doc_vector[term_id] = self.postings[term_id][doc_id]['tf_idf']
-            
-            # Calculate dot product
-            dot_product = 0
-            for term_id, q_weight in query_vector.items():
-                if term_id in doc_vector:
-                    dot_product += q_weight * doc_vector[term_id]
+            dot_product = 0.0
+            for doc_postings, q_weight in query_postings:
+                dot_product += q_weight * doc_postings[doc_id]
             
             # Get document length
             doc_length = self.doc_lengths.get(doc_id, 1.0)
@@ -223,10 +252,8 @@ class SearchEngine:
                     'doc_path': self.documents_inv[doc_id]
                 })
         
-        # Sort by similarity (descending)
-        results.sort(key=lambda x: x['similarity'], reverse=True)
-        
-        return results[:top_k]
+        # Select the top_k by similarity (descending) without sorting every result
+        return heapq.nlargest(top_k, results, key=itemgetter('similarity'))
     
     def print_results(self, results, query):
         """Print search results in a formatted way."""
@@ -239,6 +266,9 @@ class SearchEngine:
         print(f"Total documents retrieved: {len(results)}")
         print(f"{'='*80}")
         
+        # Parse the query once for all results
+        parsed_terms = self.parse_query(query)
+        
         for i, result in enumerate(results, 1):
             doc_id = result['doc_id']
             similarity = result['similarity']
@@ -251,12 +281,11 @@ class SearchEngine:
             print(f"     Cosine Similarity: {similarity:.6f}")
             
             # Show query terms in document
-            parsed_terms = self.parse_query(query)
             term_weights = []
             for term_info in parsed_terms:
                 term_id = term_info['term_id']
-                if doc_id in self.postings[term_id]:
-                    weight = self.postings[term_id][doc_id]['tf_idf']
+                weight = self.postings[term_id].get(doc_id)
+                if weight is not None:
                     term_weights.append(f"{term_info['processed']}:{weight:.3f}")
             
             if term_weights:
@@ -5,9 +5,12 @@ Includes URL validation and HTML processing helpers
 """
 
 import re
+import sys
 import string
 import math
+import struct
 import urllib.parse
+from array import array
 
 def is_number(s):
     """Check if a string is a number."""
@@ -31,9 +34,11 @@ def starts_with_punctuation(s):
         return False
     return s[0] in string.punctuation
 
+_TOKEN_RE = re.compile(r'[a-zA-Z0-9]+')
+
 def splitchars(s):
     """Split a string into tokens based on non-alphanumeric characters."""
-    return re.findall(r'[a-zA-Z0-9]+', s)
+    return _TOKEN_RE.findall(s)
 
 def normalize_token(token):
     """Normalize a token: lowercase and remove leading/trailing whitespace."""
@@ -193,4 +198,55 @@ def print_progress_bar(iteration, total, prefix='', suffix='', length=50, fill='
     
     # Print new line on completion
     if iteration == total: 
-        print()
\ No newline at end of file
+        print()
+
+# BINARY INDEX FILES
+INDEX_MAGIC = b'VSSE'
+INDEX_VERSION = 1
+
+def write_arrays(path, arrays):
+    """Write typed arrays to a binary file behind a small versioned header.
+    
+    Each entry is either an array or a (typecode, length, chunks) tuple,
+    where chunks is an iterable of arrays written one after another.
+    """
+    byteorder = b'<' if sys.byteorder == 'little' else b'>'
+    with open(path, 'wb') as f:
+        f.write(INDEX_MAGIC + bytes([INDEX_VERSION]) + byteorder + bytes([len(arrays)]))
+        for arr in arrays:
+            if isinstance(arr, array):
+                typecode, length, chunks = arr.typecode, len(arr), [arr]
+            else:
+                typecode, length, chunks = arr
+            
+            f.write(typecode.encode('ascii'))
+            f.write(struct.pack('<Q', length))
+            written = 0
+            for chunk in chunks:
+                chunk.tofile(f)
+                written += len(chunk)
+            if written != length:
+                raise ValueError(f"Expected {length} items for {path}, got {written}")
+
+def read_arrays(path):
+    """Read typed arrays written by write_arrays."""
+    with open(path, 'rb') as f:
+        header = f.read(len(INDEX_MAGIC) + 3)
+        if header[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+            raise ValueError(f"{path} is not a binary index file")
+        
+        version, byteorder, count = header[len(INDEX_MAGIC):]
+        if version != INDEX_VERSION:
+            raise ValueError(f"{path} has unsupported index version {version}")
+        swap = chr(byteorder) != ('<' if sys.byteorder == 'little' else '>')
+        
+        arrays = []
+        for _ in range(count):
+            arr = array(f.read(1).decode('ascii'))
+            length, = struct.unpack('<Q', f.read(8))
+            arr.fromfile(f, length)
+            if swap:
+                arr.byteswap()
+            arrays.append(arr)
+        
+        return arrays